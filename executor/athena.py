@@ -1,6 +1,5 @@
 import time
 from enum import Enum
-import boto3
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,6 +14,9 @@ class WorkGroup(Enum):
 
 class AthenaQueryExecutor:
     def __init__(self):
+        # Imported lazily, so that listing and dry-running scenarios never loads boto3
+        import boto3
+        
         self.athena_client = boto3.client('athena')
         self.work_group = WorkGroup.POWERUSER.value
         self.query_execution_id = None
@@ -1,5 +1,4 @@
 import logging
-import pandas as pd
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +12,9 @@ def convert_results_to_df(rows):
     Returns:
         DataFrame: A pandas DataFrame with the query results.
     """
+    # Imported lazily, pandas is only needed once a query has actually been executed
+    import pandas as pd
+    
     if not rows:
         logger.info("No data to write.")
         return
@@ -31,3 +33,36 @@ def convert_results_to_df(rows):
     return df
 
 
+def extract_values(df, column=None, max_values=None, sample=False):
+    """
+    Extracts the distinct values of a result column, to be used as the filter of a chained query.
+
+    Nulls and empty strings are dropped, as they would turn into a `LIKE '%%'` condition
+    matching every row.
+
+    Args:
+        df (DataFrame): The result holding the values.
+        column (str, optional): The column holding the values. Default is None, which takes
+                                the values of every column.
+        max_values (int, optional): The maximum number of values to be kept. Default is None (no cap).
+        sample (bool, optional): Keep a random sample instead of the first values when capping.
+
+    Returns:
+        Tuple[list, int]: The distinct values as strings, and their number before capping.
+    """
+    import pandas as pd
+    
+    if column is not None:
+        series = df[column]
+    else:
+        # Column by column, so that capping keeps the values of the first columns
+        series = pd.concat([df[col] for col in df.columns], ignore_index=True)
+    
+    series = series.dropna().astype(str)
+    series = series[series != ""].drop_duplicates()
+    distinct = len(series)
+    
+    if max_values is not None and distinct > max_values:
+        series = series.sample(n=max_values, random_state=0) if sample else series.head(max_values)
+    
+    return series.to_list(), distinct
@@ -1,3 +1,4 @@
+from lib.memory import SpilledFrame
 import logging
 import os
 import shutil
@@ -18,9 +19,10 @@ def save_results_to_csv(dataframe, output_file):
 def write(dataframe, prefix_dir="", file_name='results.csv'):
     """
     Writes the DataFrame to a CSV file. Creates an output directory if it doesn't exist.
+    Spilled results are read back and appended chunk by chunk, then removed from disk.
     
     Args:
-        dataframe (DataFrame): The pandas DataFrame to be saved.
+        dataframe (DataFrame or SpilledFrame): The pandas DataFrame to be saved.
         prefix_dir (str, optional): The prefix directory to be included in the output path.
         file_name (str, optional): The name of the output CSV file.
     """
@@ -34,9 +36,34 @@ def write(dataframe, prefix_dir="", file_name='results.csv'):
     os.makedirs(os.path.join(base_dir, prefix_dir), exist_ok=True)
     
     # Save the results to a CSV file
-    dataframe.to_csv(f"{file_path}.csv", index=False)
+    if isinstance(dataframe, SpilledFrame):
+        write_spilled(dataframe, f"{file_path}.csv")
+    else:
+        dataframe.to_csv(f"{file_path}.csv", index=False)
     logger.info(f"[SUCCEEDED] {file_path} has been saved")
     
+def write_spilled(spilled, output_file):
+    """
+    Streams a spilled result to a CSV file without loading it fully into memory.
+    
+    Args:
+        spilled (SpilledFrame): The spilled result to be saved.
+        output_file (str): The path where the CSV file will be saved.
+    """
+    try:
+        header = True
+        for chunk in spilled.iter_chunks():
+            chunk.to_csv(output_file, index=False, header=header, mode="w" if header else "a")
+            header = False
+        
+        # Still write the header line if the result has no row groups
+        if header:
+            import pandas as pd
+            
+            pd.DataFrame(columns=spilled.columns).to_csv(output_file, index=False)
+    finally:
+        spilled.cleanup()
+    
 def list_all_input(base_dir):
     """
     List all files and directories in the specified base directory.
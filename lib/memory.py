@@ -0,0 +1,287 @@
+from lib.thread import ThreadSafeWrapper
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Number of rows per row group when spilling, also the chunk size used when reading back
+SPILL_CHUNK_ROWS = 100_000
+
+def frame_size(dataframe):
+    """
+    Approximates the in-memory size of a query result.
+
+    Args:
+        dataframe (DataFrame or SpilledFrame): The result to be measured.
+
+    Returns:
+        int: The approximate size in bytes. Spilled and empty results count as 0.
+    """
+    if dataframe is None or isinstance(dataframe, SpilledFrame):
+        return 0
+
+    return int(dataframe.memory_usage(index=True, deep=True).sum())
+
+class SpilledFrame:
+    def __init__(self, path, rows, columns, size):
+        """
+        Initializes a SpilledFrame instance.
+
+        This class is a handle to a query result that has been spilled to a temporary
+        columnar (parquet) file. The data is only read back when it is needed, either
+        fully with `load` or chunk by chunk with `iter_chunks`.
+
+        Args:
+            path (str): The path of the parquet file holding the result.
+            rows (int): The number of rows in the result.
+            columns (list): The column names of the result.
+            size (int): The in-memory size in bytes of the result before it was spilled.
+        """
+        self.path = path
+        self.rows = rows
+        self.columns = columns
+        self.size = size
+
+    @property
+    def empty(self):
+        return self.rows == 0
+
+    def load(self, columns=None):
+        """
+        Reads the spilled result back into memory.
+
+        Args:
+            columns (list, optional): Only read these columns. Default is all columns.
+
+        Returns:
+            DataFrame: The spilled result.
+        """
+        from fastparquet import ParquetFile
+
+        return ParquetFile(self.path).to_pandas(columns=columns)
+
+    def iter_chunks(self, columns=None):
+        """
+        Reads the spilled result back one row group at a time.
+
+        Args:
+            columns (list, optional): Only read these columns. Default is all columns.
+
+        Yields:
+            DataFrame: A chunk of at most SPILL_CHUNK_ROWS rows.
+        """
+        from fastparquet import ParquetFile
+
+        yield from ParquetFile(self.path).iter_row_groups(columns=columns)
+
+    def cleanup(self):
+        """Removes the spilled file from disk."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __repr__(self):
+        return f"SpilledFrame(path={self.path!r}, rows={self.rows}, size={self.size})"
+
+def materialize(result, columns=None):
+    """
+    Returns an in-memory DataFrame for a result, reading it back if it was spilled.
+
+    Args:
+        result (DataFrame or SpilledFrame): The result to be materialized.
+        columns (list, optional): Only read these columns of a spilled result.
+
+    Returns:
+        DataFrame: The in-memory result.
+    """
+    if isinstance(result, SpilledFrame):
+        return result.load(columns)
+
+    return result
+
+class MemoryBudget(ThreadSafeWrapper):
+    def __init__(self, limit_bytes=None, spill_bytes=None, spill_dir=None, default_bytes=None):
+        """
+        Initializes a MemoryBudget instance.
+
+        The budget tracks the approximate size of in-flight results. Each dispatched task
+        reserves an estimate of its result size, based on the largest result seen so far,
+        and the runner delays dispatching new tasks while the reservations exceed the limit.
+        Until a result size is known, and without a default estimate, the runner dispatches
+        one task at a time. Results larger than the spill threshold are written to temporary
+        parquet files.
+
+        `peak_bytes` is the peak of the reservations, where each result counts for its actual
+        in-memory size once it has completed. It is an approximation of the real peak, as
+        in-flight tasks count for their estimate only.
+
+        Args:
+            limit_bytes (int, optional): The global memory budget. Default is None (unlimited).
+            spill_bytes (int, optional): Results larger than this are spilled to disk.
+                                         Default is None (never spill).
+            spill_dir (str, optional): Directory of the spilled files. Default is a new
+                                       temporary directory.
+            default_bytes (int, optional): The estimated result size used until a result has
+                                           completed. Default is None (unknown).
+        """
+        super().__init__()
+        self.limit_bytes = limit_bytes
+        self.spill_bytes = spill_bytes
+        self.spill_dir = spill_dir
+        self.reserved_bytes = 0
+        self.peak_bytes = 0
+        self.default_bytes = default_bytes
+        # None until a result has completed
+        self.largest_result = None
+
+    def estimate(self):
+        """
+        Returns the estimated size of the next result.
+
+        Returns:
+            int or None: The largest result seen so far, the default estimate before any
+                         result has completed, or None if neither is known.
+        """
+        if self.largest_result is not None:
+            return self.largest_result
+
+        return self.default_bytes
+
+    def try_reserve(self, size, force=False):
+        """
+        Reserves room for an in-flight result if the budget allows it.
+
+        Args:
+            size (int): The number of bytes to be reserved.
+            force (bool, optional): Reserve even if the budget is exceeded. The runner uses
+                                    this when nothing is in flight, so that it never stalls.
+
+        Returns:
+            bool: True if the bytes have been reserved.
+        """
+        @self._with_lock
+        def reserve():
+            if not force and self.limit_bytes is not None \
+                    and self.reserved_bytes + size > self.limit_bytes:
+                return False
+
+            self.reserved_bytes += size
+            self.peak_bytes = max(self.peak_bytes, self.reserved_bytes)
+            return True
+
+        return reserve()
+
+    def resize(self, reserved, actual, observed=None):
+        """
+        Swaps a reservation for the actual size of the result once it is known.
+
+        Args:
+            reserved (int): The number of bytes previously reserved.
+            actual (int): The number of bytes the result still holds in memory.
+            observed (int, optional): The size of the result before it was spilled, used
+                                      to estimate the next results. Default is `actual`.
+        """
+        if observed is None:
+            observed = actual
+
+        @self._with_lock
+        def swap():
+            # The result was fully in memory before it was spilled
+            self.peak_bytes = max(self.peak_bytes, self.reserved_bytes - reserved + observed)
+            self.reserved_bytes += actual - reserved
+            self.largest_result = max(self.largest_result or 0, observed)
+
+        swap()
+
+    def release(self, size):
+        """
+        Releases a reservation once its result has been written.
+
+        Args:
+            size (int): The number of bytes to be released.
+        """
+        @self._with_lock
+        def free():
+            self.reserved_bytes = max(self.reserved_bytes - size, 0)
+
+        free()
+
+    def spill_if_large(self, dataframe, size=None):
+        """
+        Spills a result to a temporary parquet file if it is larger than the spill threshold.
+
+        Args:
+            dataframe (DataFrame): The result to be checked.
+            size (int, optional): The in-memory size of the result, if already known.
+
+        Returns:
+            DataFrame or SpilledFrame: The result itself, or a handle to the spilled file.
+        """
+        # Measuring walks every string of the result, skip it when spilling is off
+        if self.spill_bytes is None:
+            return dataframe
+
+        if size is None:
+            size = frame_size(dataframe)
+        if size <= self.spill_bytes:
+            return dataframe
+
+        return self.spill(dataframe, size)
+
+    def spill(self, dataframe, size=None):
+        """
+        Writes a result to a temporary parquet file.
+
+        Args:
+            dataframe (DataFrame): The result to be spilled.
+            size (int, optional): The in-memory size of the result, if already known.
+
+        Returns:
+            SpilledFrame: A handle to the spilled file.
+        """
+        from fastparquet import write as write_parquet
+
+        if size is None:
+            size = frame_size(dataframe)
+
+        @self._with_lock
+        def ensure_dir():
+            if self.spill_dir is None:
+                self.spill_dir = tempfile.mkdtemp(prefix="athena-dumper-")
+            os.makedirs(self.spill_dir, exist_ok=True)
+            return self.spill_dir
+
+        path = os.path.join(ensure_dir(), f"{uuid.uuid4().hex}.parquet")
+        write_parquet(path, dataframe, row_group_offsets=SPILL_CHUNK_ROWS, write_index=False)
+        logger.info(f"[SPILLED] {len(dataframe)} rows ({size} bytes) spilled to {path}")
+
+        return SpilledFrame(path, len(dataframe), list(dataframe.columns), size)
+
+    def cleanup(self):
+        """Removes the spill directory and every file left in it."""
+        if self.spill_dir is not None and os.path.isdir(self.spill_dir):
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+# The budget shared by the runner and chained queries, None means unlimited
+_budget = None
+
+def set_budget(budget):
+    """
+    Sets the global memory budget.
+
+    Args:
+        budget (MemoryBudget or None): The budget to be used. None disables budgeting.
+    """
+    global _budget
+    _budget = budget
+
+def get_budget():
+    """
+    Returns the global memory budget.
+
+    Returns:
+        MemoryBudget or None: The current budget.
+    """
+    return _budget
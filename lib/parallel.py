@@ -1,19 +1,30 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from lib.io import write
+from lib.memory import MemoryBudget, frame_size, get_budget
 from lib.task import Task
+import logging
 
-def run(tasks, workers, prefix_dir, prefix_filename):
+logger = logging.getLogger(__name__)
+
+def run(tasks, workers, prefix_dir, prefix_filename, budget=None):
     """
     Executes multiple SQL tasks in parallel and write to local.
 
+    New tasks are only dispatched while the memory budget has room for their estimated
+    result size, the larger of the planner's estimate and the largest result so far.
+    Results above the spill threshold are spilled to disk by the worker before being
+    handed over to the writer.
+
     Args:
         tasks (List[List]): A list of SQL query strings to be executed.
         workers (int, optional): Number of workers handling task execution in parallel. Default is 6.
+        budget (MemoryBudget, optional): The memory budget of the run. Default is the global budget.
         
     Returns:
         List: The results of the executed tasks.
     """
     workers = workers or 6
+    budget = budget or get_budget() or MemoryBudget()
     
     # Initialize an empty list to store the logs of task results.
     result_logs = []
@@ -24,27 +35,67 @@ def run(tasks, workers, prefix_dir, prefix_filename):
         logger.exception("Each item in tasks should be an instance of Task", TypeError)
         raise TypeError
 
+    def run_task(task):
+        # Runs in the worker thread, so large results never reach the main thread in memory.
+        # The result is measured once, returning the bytes it still holds in memory and its full size.
+        result = task.callable_func()
+        size = frame_size(result)
+        # Read the chained query stats before spilling, spilled results do not keep them
+        stats = result.attrs.get("chain_stats") if result is not None else None
+        if task.spill and result is not None:
+            return budget.spill(result, size), 0, size, stats
+        
+        kept = budget.spill_if_large(result, size)
+        return kept, size if kept is result else 0, size, stats
+
+    queue = list(tasks)
+    # Map each in-flight future to its task ID and the number of bytes reserved for it.
+    future_to_tasks = {}
+
     # Use ThreadPoolExecutor to execute the tasks in parallel with the specified number of workers.
     with ThreadPoolExecutor(workers) as executor:
-        # Submit the callable functions of the tasks to the executor.
-        # Map each future to its corresponding task ID.
-        future_to_tasks = {
-            executor.submit(task.callable_func): task.id for task in tasks
-        }
-        
-        # Process the results as the futures complete.
-        for future in as_completed(future_to_tasks):
-            task_id = future_to_tasks[future]  # Get the task ID associated with the completed future.
-            try:
-                result = future.result()  # Retrieve the result of the completed task.
-            except Exception as exc:
-                # If an exception occurred during task execution, log it as a failure.
-                result_logs.append(f"[FAILED] Task-{task_id} generated an exception: {exc}")
-            else:
-                # If the task executed successfully, log it as a success.
-                result_logs.append(f"[SUCCEEDED] Task-{task_id} executed successfully")
-                # Write the result to a file, with a filename based on the task ID and optional prefix.
-                write(result, prefix_dir, f"{prefix_filename}_{task_id}" if prefix_filename != "" else f"{task_id}")
+        while queue or future_to_tasks:
+            # Dispatch as many tasks as the workers and the memory budget allow.
+            # When nothing is in flight a task is always dispatched, so the run never stalls.
+            while queue and len(future_to_tasks) < workers:
+                reserved = budget.estimate()
+                if queue[0].estimated_bytes is not None:
+                    # Trust the planner's estimate if it is larger than the results seen so far
+                    reserved = max(queue[0].estimated_bytes, reserved or 0)
+                if reserved is None and budget.limit_bytes is not None and future_to_tasks:
+                    # No result size is known yet, dispatch one task at a time until there is one
+                    logger.debug(f"Delaying Task-{queue[0].id}: no result size known yet")
+                    break
+                reserved = reserved or 0
+                if not budget.try_reserve(reserved, force=not future_to_tasks):
+                    logger.debug(f"Delaying Task-{queue[0].id}: {budget.reserved_bytes} bytes in flight")
+                    break
+                task = queue.pop(0)
+                future_to_tasks[executor.submit(run_task, task)] = (task.id, reserved)
+            
+            # Process the results as the futures complete.
+            done, _ = wait(future_to_tasks, return_when=FIRST_COMPLETED)
+            for future in done:
+                task_id, reserved = future_to_tasks.pop(future)  # Get the task ID associated with the completed future.
+                try:
+                    result, size, observed, stats = future.result()  # Retrieve the result of the completed task.
+                except Exception as exc:
+                    # If an exception occurred during task execution, log it as a failure.
+                    budget.release(reserved)
+                    result_logs.append(f"[FAILED] Task-{task_id} generated an exception: {exc}")
+                    continue
+
+                # Hold the actual size of the result until it has been written.
+                budget.resize(reserved, size, observed)
+                try:
+                    # If the task executed successfully, log it as a success.
+                    result_logs.append(f"[SUCCEEDED] Task-{task_id} executed successfully"
+                                       + (f", chained values: {stats}" if stats else ""))
+                    # Write the result to a file, with a filename based on the task ID and optional prefix.
+                    write(result, prefix_dir, f"{prefix_filename}_{task_id}" if prefix_filename != "" else f"{task_id}")
+                finally:
+                    budget.release(size)
+                    del result
 
     # Return the list of result logs.
     return result_logs
@@ -0,0 +1,207 @@
+from concurrent.futures import ThreadPoolExecutor
+from executor.athena import AthenaQueryExecutor
+from lib.qexec import capture_queries
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Cached estimates, keyed by the hash of the SQL
+PLAN_CACHE_FILE = ".plan_cache.json"
+
+# Estimates older than this are requested again, as tables keep growing
+PLAN_CACHE_TTL = 24 * 60 * 60
+
+def parse_io_plan(rows):
+    """
+    Extracts the scan and output estimates from the result of an `EXPLAIN (TYPE IO, FORMAT JSON)` query.
+
+    Args:
+        rows (list): The rows returned by Athena for the EXPLAIN query.
+
+    Returns:
+        dict: The estimated `scan_bytes`, `output_bytes` and `output_rows`. Unknown values are None.
+    """
+    # The JSON plan may be split over several rows
+    text = "".join(col.get("VarCharValue", "") for row in rows for col in row["Data"])
+    start = text.find("{")
+    if start == -1:
+        raise ValueError("No JSON plan found in the EXPLAIN result")
+    plan, _ = json.JSONDecoder().raw_decode(text[start:])
+
+    def number(value):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+        return None if math.isnan(value) or math.isinf(value) else int(value)
+
+    scan_bytes = None
+    for table in plan.get("inputTableColumnInfos", []):
+        size = number(table.get("estimate", {}).get("outputSizeInBytes"))
+        if size is not None:
+            scan_bytes = (scan_bytes or 0) + size
+
+    estimate = plan.get("estimate", {})
+    return {
+        "scan_bytes": scan_bytes,
+        "output_bytes": number(estimate.get("outputSizeInBytes")),
+        "output_rows": number(estimate.get("outputRowCount")),
+    }
+
+class TaskPlan:
+    def __init__(self, task, queries, estimates):
+        """
+        Initializes a TaskPlan instance.
+
+        This class holds the rendered queries of a task and their summed estimates.
+        For chained tasks every step is estimated without the values of the previous step,
+        so the estimates are an upper bound.
+
+        Args:
+            task (Task): The planned task.
+            queries (list of str): The rendered SQL of each step of the task.
+            estimates (list of dict): The estimate of each query, None when unknown.
+        """
+        self.task = task
+        self.queries = queries
+        self.scan_bytes = self._total(estimates, "scan_bytes")
+        self.output_bytes = self._total(estimates, "output_bytes")
+
+    @staticmethod
+    def _total(estimates, key):
+        values = [estimate[key] for estimate in estimates if estimate and estimate[key] is not None]
+        return sum(values) if values else None
+
+class Planner:
+    def __init__(self, max_scan_bytes=None, oversize_bytes=None, cache_file=PLAN_CACHE_FILE, cache_ttl=PLAN_CACHE_TTL):
+        """
+        Initializes a Planner instance.
+
+        The planner renders the queries of each task, asks Athena for their IO estimates
+        with `EXPLAIN (TYPE IO, FORMAT JSON)` and uses them to order and filter the tasks
+        before any of them is executed.
+
+        Args:
+            max_scan_bytes (int, optional): Tasks estimated to scan more are refused. Default is None (no limit).
+            oversize_bytes (int, optional): Tasks estimated to return more have their result spilled
+                                            to disk. Default is None (never).
+            cache_file (str, optional): The path of the estimate cache.
+            cache_ttl (int, optional): The number of seconds an estimate stays valid.
+        """
+        self.max_scan_bytes = max_scan_bytes
+        self.oversize_bytes = oversize_bytes
+        self.cache_file = cache_file
+        self.cache_ttl = cache_ttl
+        self.cache = self._load_cache()
+
+    def _load_cache(self):
+        if not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            logger.debug(f"Ignoring unreadable plan cache {self.cache_file}")
+            return {}
+
+    def _save_cache(self):
+        try:
+            with open(self.cache_file, "w") as file:
+                json.dump(self.cache, file, indent=2, sort_keys=True)
+        except OSError:
+            logger.debug(f"Could not write plan cache {self.cache_file}")
+
+    def estimate(self, query):
+        """
+        Returns the IO estimate of a query, from the cache or by running EXPLAIN on Athena.
+
+        Args:
+            query (str): The rendered SQL of the query.
+
+        Returns:
+            dict or None: The estimate as returned by `parse_io_plan`, None if EXPLAIN failed,
+                          including when Athena raised an error (e.g. throttling).
+        """
+        key = hashlib.sha256(query.encode("utf-8")).hexdigest()
+        cached = self.cache.get(key)
+        if cached is not None and time.time() - cached["at"] < self.cache_ttl:
+            return cached["estimate"]
+
+        try:
+            executor = AthenaQueryExecutor()
+            executor.execute_query(f"EXPLAIN (TYPE IO, FORMAT JSON) {query}")
+            executor.wait_for_query_to_complete()
+            if not executor.query_status:
+                logger.warning(f"[UNPLANNED] EXPLAIN failed for query: {query}")
+                return None
+
+            estimate = parse_io_plan(executor.get_query_results())
+        except Exception as e:
+            # A failed estimate must not stop the run, the task is submitted last instead
+            logger.warning(f"[UNPLANNED] {e} for query: {query}")
+            return None
+
+        self.cache[key] = {"at": time.time(), "estimate": estimate}
+        return estimate
+
+    def plan(self, tasks, workers=None):
+        """
+        Orders the tasks longest-first and refuses the ones over the scan budget.
+
+        The estimated scan size is used as the proxy of the running time, so the longest
+        queries are submitted first and do not delay the end of the run. Tasks without an
+        estimate are kept and submitted last. The estimated output size is stored on each task
+        for the runner's memory reservation, and oversized tasks are flagged to spill their
+        result to disk once their query has finished.
+
+        Args:
+            tasks (List[Task]): The tasks of the scenario.
+            workers (int, optional): Number of EXPLAIN queries running in parallel. Default is 6.
+
+        Returns:
+            Tuple[List[Task], List[str]]: The tasks to be run in submission order, and the logs
+                                          of the refused tasks.
+        """
+        rendered = []
+        for task in tasks:
+            with capture_queries() as queries:
+                task.callable_func()
+            rendered.append((task, queries))
+
+        # Explain each distinct query once, in parallel
+        distinct = list({query for _, queries in rendered for query in queries})
+        try:
+            with ThreadPoolExecutor(workers or 6) as executor:
+                estimates = dict(zip(distinct, executor.map(self.estimate, distinct)))
+        finally:
+            self._save_cache()
+
+        plans = [TaskPlan(task, queries, [estimates[query] for query in queries]) for task, queries in rendered]
+        plans.sort(key=lambda plan: -1 if plan.scan_bytes is None else plan.scan_bytes, reverse=True)
+
+        planned = []
+        refused_logs = []
+        for plan in plans:
+            task_id = plan.task.id
+            logger.info(f"[PLANNED] Task-{task_id}: scan ~{plan.scan_bytes} bytes, output ~{plan.output_bytes} bytes")
+
+            if self.max_scan_bytes is not None and plan.scan_bytes is not None \
+                    and plan.scan_bytes > self.max_scan_bytes:
+                refused_logs.append(f"[REFUSED] Task-{task_id} would scan ~{plan.scan_bytes} bytes, over the budget of {self.max_scan_bytes} bytes")
+                continue
+
+            plan.task.estimated_bytes = plan.output_bytes
+
+            if self.oversize_bytes is not None and plan.output_bytes is not None \
+                    and plan.output_bytes > self.oversize_bytes:
+                logger.info(f"[OVERSIZED] Task-{task_id} result will be spilled to disk")
+                plan.task.spill = True
+
+            planned.append(plan.task)
+
+        return planned, refused_logs
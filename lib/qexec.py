@@ -1,12 +1,37 @@
 from executor.athena import AthenaQueryExecutor
-from lib.dataframe import convert_results_to_df
+from lib.dataframe import convert_results_to_df, extract_values
+from lib.memory import SpilledFrame, get_budget, materialize
 from query.conditions import in_with_regex
+from contextlib import contextmanager
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Per-thread list of captured SQL, set while rendering tasks without executing them
+_capture = threading.local()
+
+@contextmanager
+def capture_queries():
+    """
+    Captures the SQL of every query executed in the current thread instead of running it on Athena.
+
+    While capturing, `execute` records the rendered SQL and returns None, so chained queries
+    render each step without the values of the previous one.
+
+    Yields:
+        list of str: The rendered SQL, in execution order.
+    """
+    previous = getattr(_capture, "queries", None)
+    _capture.queries = []
+    try:
+        yield _capture.queries
+    finally:
+        _capture.queries = previous
+
 class ChainedQuery:
-    def __init__(self, query, dependant_field=None):
+    def __init__(self, query, dependant_field=None, output_column=None, max_values=None, sample=False):
         """
         Initializes a ChainedQuery instance.
 
@@ -18,9 +43,58 @@ class ChainedQuery:
             query (Query): The Pypika query to be executed.
             dependant_field (Field, optional): A field from the query results that the
                                                 next query will depend on. Default is None.
+            output_column (str, optional): The column of this query's result passed on to the
+                                           next query. Default is None, which takes the only column
+                                           of the result, or every column if there are several.
+            max_values (int, optional): The maximum number of distinct values passed on to the
+                                        next query. Default is None (no cap).
+            sample (bool, optional): Pass on a random sample instead of the first values when
+                                     capping. Default is False.
         """
         self.query = query
         self.dependant_field = dependant_field
+        self.output_column = output_column
+        self.max_values = max_values
+        self.sample = sample
+        # Filled by chained_execute with the size and build time of the values passed on
+        self.stats = None
+
+    def output_values(self, df):
+        """
+        Builds the distinct values of this query's result to be passed on to the next query.
+
+        Args:
+            df (DataFrame or SpilledFrame): The result of this query.
+
+        Returns:
+            list: The distinct values, without nulls.
+        """
+        start = time.perf_counter()
+        
+        column = self.output_column
+        if column is None and len(df.columns) == 1:
+            column = df.columns[0]
+        if column is not None and column not in df.columns:
+            raise KeyError(f"Output column '{column}' not found in {list(df.columns)}")
+        
+        # Only read the output column back if the result was spilled
+        rows = len(df) if not isinstance(df, SpilledFrame) else df.rows
+        values, distinct = extract_values(
+                                materialize(df, [column] if column is not None else None),
+                                column,
+                                self.max_values,
+                                self.sample,
+                            )
+        
+        self.stats = {
+            "rows": rows,
+            "distinct_values": distinct,
+            "values": len(values),
+            "build_seconds": time.perf_counter() - start,
+        }
+        logger.debug(f"[CHAINED] Passing on values of {column or 'every column'}: {self.stats}")
+        
+        return values
 
 def chained_execute(queries):
     """
@@ -28,6 +102,13 @@ def chained_execute(queries):
 
     This function runs a series of queries where each query can depend on the results of the previous one.
     It handles the execution and chaining of queries based on their dependencies.
+    Only the distinct, non-null values of each step's output column are passed on, and
+    the size and build time of each value set are recorded in the step's `stats`. The stats
+    of every step are also attached to the returned DataFrame as `attrs["chain_stats"]`.
+    If a step returns no rows or no usable value, the chain stops and returns an empty
+    DataFrame. Only when capturing queries are the next steps rendered without a filter.
+    Intermediate results above the spill threshold of the global memory budget are spilled
+    to disk, and the next step only reads the output column back.
 
     Args:
         queries (list of ChainedQuery): A list of ChainedQuery objects representing the sequence of queries.
@@ -36,9 +117,10 @@ def chained_execute(queries):
         DataFrame: The result of the final query in the sequence.
     """
     df = None
-    result = None
+    budget = get_budget()
+    chain_stats = []
     
-    for chained_query in queries:
+    for index, chained_query in enumerate(queries):
         # Ensure each item in queries is an instance of ChainedQuery
         if not isinstance(chained_query, ChainedQuery):
             logger.exception("Each item in queries should be an instance of ChainedQuery", TypeError)
@@ -47,14 +129,23 @@ def chained_execute(queries):
         # Get the current query from the ChainedQuery object
         curr_query = chained_query.query
         
-        # If there are previous results and they are not empty
-        if df is not None and not df.empty:
+        # When capturing, there are no previous results and the query is rendered unfiltered
+        if index > 0 and not _is_capturing():
             values = []
-            # Iterate over each column in the DataFrame
-            for column in df.columns:
-                # Extend the values with values from the current column
-                # Convert column values to a list and add them to values
-                values.extend(df[column].to_list())
+            # Pass on the distinct values of the previous query's output column
+            if df is not None and not df.empty:
+                values = queries[index - 1].output_values(df)
+                chain_stats.append({"step": index, **queries[index - 1].stats})
+            else:
+                chain_stats.append({"step": index, "rows": 0, "distinct_values": 0, "values": 0, "build_seconds": 0.0})
+            
+            if isinstance(df, SpilledFrame):
+                df.cleanup()
+                
+            # Without any usable value the next steps can only match nothing, stop the chain
+            if not values:
+                logger.info(f"No values to pass on to step {index + 1}, stopping the chain")
+                return _with_stats(_empty_frame(), chain_stats)
                 
             # Update the current query to filter based on these values
             curr_query = curr_query.where(in_with_regex(chained_query.dependant_field, values))
@@ -62,6 +153,24 @@ def chained_execute(queries):
         # Execute the current query
         df = execute(curr_query)
         
+        # Spill large intermediates, the final result is handed over to the runner as is
+        if budget is not None and index < len(queries) - 1:
+            df = budget.spill_if_large(df)
+        
+    return _with_stats(df, chain_stats)
+
+def _is_capturing():
+    return getattr(_capture, "queries", None) is not None
+
+def _empty_frame():
+    import pandas as pd
+    
+    return pd.DataFrame()
+
+def _with_stats(df, chain_stats):
+    # Expose the value set stats of each step to the runner
+    if df is not None and chain_stats:
+        df.attrs["chain_stats"] = chain_stats
     return df
         
 
@@ -78,6 +187,11 @@ def execute(query):
     """
     query = query.limit(50).get_sql(quote_char=None)
     
+    # Only render the query when capturing, without touching AWS
+    if _is_capturing():
+        _capture.queries.append(query)
+        return None
+    
     # Initialize the AthenaQueryExecutor
     executor = AthenaQueryExecutor()
 
@@ -0,0 +1,129 @@
+import ast
+import importlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Package holding the scenario modules, resolved from the project root rather than the working directory
+SCENARIO_PACKAGE = "scenarios"
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), SCENARIO_PACKAGE)
+
+# Cached index of the scenarios found in the scenario directory
+INDEX_FILE = os.path.join(SCENARIO_DIR, ".index.json")
+
+# Modules in the scenario directory that are not scenarios themselves
+EXCLUDED_MODULES = {"__init__", "scenario"}
+
+def parse_scenario_file(file_path):
+    """
+    Reads a scenario module without importing it, looking for a `Scenario` class.
+
+    Args:
+        file_path (str): The path of the python file to be parsed.
+
+    Returns:
+        dict or None: The description of the scenario, or None if the file has no `Scenario` class.
+    """
+    with open(file_path, "r") as file:
+        try:
+            tree = ast.parse(file.read(), filename=file_path)
+        except SyntaxError as e:
+            logger.warning(f"Skipping {file_path}: {e}")
+            return None
+
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == "Scenario":
+            docstring = ast.get_docstring(node) or ast.get_docstring(tree) or ""
+            return {
+                "path": file_path,
+                "description": docstring.strip().split("\n")[0],
+            }
+
+    return None
+
+def build_index(scenario_dir=SCENARIO_DIR, index_file=INDEX_FILE):
+    """
+    Builds the index of available scenarios, reusing cached entries of unchanged files.
+
+    The index maps each scenario name (its module path relative to the scenario directory,
+    with slashes) to its file. Files are only parsed again when their modification time or
+    size has changed since the index was written.
+
+    Args:
+        scenario_dir (str, optional): The directory holding the scenario modules.
+        index_file (str, optional): The path of the cached index.
+
+    Returns:
+        dict: A mapping of scenario names to their description.
+    """
+    cached = {}
+    if os.path.exists(index_file):
+        try:
+            with open(index_file, "r") as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            logger.debug(f"Ignoring unreadable scenario index {index_file}")
+
+    index = {}
+    files = {}
+    for root, dirs, filenames in os.walk(scenario_dir):
+        # Skip hidden and cache directories
+        dirs[:] = [d for d in dirs if not d.startswith((".", "__"))]
+        for filename in filenames:
+            name, ext = os.path.splitext(filename)
+            if ext != ".py" or name in EXCLUDED_MODULES:
+                continue
+
+            file_path = os.path.join(root, filename)
+            stat = os.stat(file_path)
+            signature = [stat.st_mtime_ns, stat.st_size]
+            scenario_name = os.path.relpath(os.path.join(root, name), scenario_dir).replace(os.sep, "/")
+
+            entry = cached.get("files", {}).get(file_path)
+            if entry is None or entry["signature"] != signature:
+                entry = {"signature": signature, "scenario": parse_scenario_file(file_path)}
+            files[file_path] = entry
+
+            if entry["scenario"] is not None:
+                index[scenario_name] = entry["scenario"]
+
+    if files != cached.get("files"):
+        try:
+            with open(index_file, "w") as file:
+                json.dump({"files": files}, file, indent=2, sort_keys=True)
+        except OSError:
+            logger.debug(f"Could not write scenario index {index_file}")
+
+    return index
+
+def load_scenario(name, scenario_dir=SCENARIO_DIR, package=SCENARIO_PACKAGE):
+    """
+    Imports a scenario module from the index and returns its `Scenario` class.
+
+    Args:
+        name (str): The name of the scenario, e.g. `foo_scenario` or `team/bar_scenario`.
+        scenario_dir (str, optional): The directory holding the scenario modules.
+        package (str, optional): The import name of the scenario directory.
+
+    Returns:
+        type: The `Scenario` class of the module.
+
+    Raises:
+        ModuleNotFoundError: If there is no scenario with that name.
+    """
+    index = build_index(scenario_dir, os.path.join(scenario_dir, ".index.json"))
+    # Accept dotted names and file paths as well
+    name = name.replace(".", "/")
+    if name.endswith("/py"):
+        name = name[:-len("/py")]
+    if name.startswith(f"{package}/"):
+        name = name[len(package) + 1:]
+
+    if name not in index:
+        available = ", ".join(sorted(index)) or "none"
+        raise ModuleNotFoundError(f"Scenario '{name}' not found in {scenario_dir}. Available scenarios: {available}")
+
+    module = importlib.import_module(f"{package}.{name.replace('/', '.')}")
+    return getattr(module, "Scenario")
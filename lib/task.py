@@ -10,6 +10,10 @@ class Task(ThreadSafeWrapper):
         # Store the id and the callable function provided during initialization.
         self.id = id
         self.callable_func = callable_func
+        # Set by the planner when the result is expected to be too large to be kept in memory.
+        self.spill = False
+        # Estimated result size in bytes set by the planner, reserved by the runner's memory budget.
+        self.estimated_bytes = None
     
     def run(self):
         # Define a nested function that wraps the call to callable_func with a lock.
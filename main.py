@@ -1,50 +1,97 @@
 
 from lib.io import export_files_recursive
 from lib.log import setup_logging
+from lib.memory import MemoryBudget, set_budget
 from lib.parallel import run
+from lib.registry import build_index, load_scenario
 import argparse
-import importlib
 import logging
 import os
 
 logger = logging.getLogger(__name__)
 
 def run_scenario(scenario_path):
-    try:
-        # Replace slashes with dots to form the module path
-        scenario_module = importlib.import_module(f"scenarios.{scenario_path}")
-        if hasattr(scenario_module, 'Scenario'):
-            scenario_class = getattr(scenario_module, 'Scenario')
-            scenario_instance = scenario_class()
-            return scenario_instance.run()
-        else:
-            raise NotImplementedError()
-    except NotImplementedError as e:
-        logger.exception(f"No 'Scenario' class found in {scenario_module}", e)
-        raise e
-    except ModuleNotFoundError as e:
-        logger.exception(f"Module {scenario_module} not found", e)
-        raise e
+    # Only the requested scenario module is imported, found through the scenario index
+    scenario_class = load_scenario(scenario_path)
+    scenario_instance = scenario_class()
+    return scenario_instance.run()
+
+def list_scenarios():
+    """
+    Prints every scenario of the scenario index without importing them.
+    """
+    index = build_index()
+    for name in sorted(index):
+        description = index[name]["description"]
+        print(f"{name}\t{description}" if description else name)
+
+def dry_run(tasks):
+    """
+    Prints the SQL of each task without executing it on Athena.
+    
+    Args:
+        tasks (List[Task]): The tasks of the scenario.
+    """
+    # Imported here, the regular run path does not need the capture machinery
+    from lib.qexec import capture_queries
+    
+    for task in tasks:
+        with capture_queries() as queries:
+            task.callable_func()
+        print(f"-- Task-{task.id}")
+        for step, query in enumerate(queries, start=1):
+            if len(queries) > 1:
+                print(f"-- Step {step}")
+            print(f"{query};")
+        print()
     
 def main():
     parser = argparse.ArgumentParser(description='Run a scenario')
     parser.add_argument('-s', '--scenario', type=str, help='The scenario module to run')
+    parser.add_argument('--list', action='store_true', help='List the available scenarios and exit')
+    parser.add_argument('--dry-run', action='store_true', help='Print the SQL of each task of the scenario without running it on Athena')
     parser.add_argument('-w', '--workers', type=int, help='The numbers of queries to processes in one pass')
     parser.add_argument('-e', '--export', 
                             type=str, 
                             help='The target directory path follows up by prefix file name (optional). export the output file to certain directory based on filename automatically.',
                             nargs='*',
                         )
+    parser.add_argument('--memory-budget', type=int, help='The approximate memory budget in MB for in-flight results (optional). New queries are delayed while it is exceeded.')
+    parser.add_argument('--result-estimate', type=int, help='The estimated result size in MB used by --memory-budget until a result has completed (optional). Without it, tasks are dispatched one at a time until then.')
+    parser.add_argument('--spill-threshold', type=int, help='Results and intermediates larger than this size in MB are spilled to temporary parquet files (optional).')
+    parser.add_argument('--plan', action='store_true', help='Estimate each task with EXPLAIN before running, submitting the largest scans first')
+    parser.add_argument('--max-scan-gb', type=float, help='Refuse the tasks estimated to scan more than this size in GB (optional, requires --plan).')
+    parser.add_argument('--oversize-mb', type=int, help='Spill the results of the tasks estimated to return more than this size in MB (optional, requires --plan).')
     parser.add_argument('--log-level', type=str, default="INFO", help="Set the logging level (e.g., DEBUG, INFO, QUERY, ERROR)")
 
     args = parser.parse_args()
+    
+    setup_logging(args.log_level)
+    
+    if args.list:
+        list_scenarios()
+        return
+    
+    if not args.scenario:
+        parser.error("the following arguments are required: -s/--scenario")
+    
+    # The budget has to be set before the scenario builds its tasks
+    budget = MemoryBudget(
+                limit_bytes=args.memory_budget * 1024 * 1024 if args.memory_budget else None,
+                spill_bytes=args.spill_threshold * 1024 * 1024 if args.spill_threshold else None,
+                default_bytes=args.result_estimate * 1024 * 1024 if args.result_estimate else None,
+            )
+    set_budget(budget)
+    
     tasks = run_scenario(args.scenario)
     
+    if args.dry_run:
+        dry_run(tasks)
+        return
+    
     targeted_path = None
     prefix_filename = ""
     
-    setup_logging(args.log_level)
-    
     if(args.export):
         if len(args.export) == 1:
             targeted_path = args.export[0]
@@ -59,12 +106,30 @@ def main():
     if os.path.exists(prefix_filename):
         raise ValueError("Invalid prefix name. prefix name should not in directory path structure")
             
-    results = run(
-                tasks=tasks,
-                workers=args.workers,
-                prefix_dir=args.scenario,
-                prefix_filename=prefix_filename
-            )
+    refused_logs = []
+    if args.plan:
+        # Imported here, planning is optional
+        from lib.planner import Planner
+        
+        planner = Planner(
+                    max_scan_bytes=int(args.max_scan_gb * 1024 ** 3) if args.max_scan_gb else None,
+                    oversize_bytes=args.oversize_mb * 1024 * 1024 if args.oversize_mb else None,
+                )
+        tasks, refused_logs = planner.plan(tasks, args.workers)
+            
+    try:
+        results = refused_logs + run(
+                    tasks=tasks,
+                    workers=args.workers,
+                    prefix_dir=args.scenario,
+                    prefix_filename=prefix_filename,
+                    budget=budget,
+                )
+    finally:
+        # Remove any spilled file left behind by a failed task
+        budget.cleanup()
+        
+    logger.debug(f"Peak of in-flight results: {budget.peak_bytes} bytes")
     # Retrieve the result from parallelism process
     for result in results:
         logger.info(result)
@@ -53,7 +53,8 @@ class Scenario(ThreadSafeWrapper, IScenario):
                         ChainedQuery(Query
                             .from_(bar.groups)  # Specify the 'groups' table
                             .select(field("user_id", alias="pass"))  # Select 'user_id' and alias it as 'pass'
-                            .where(in_with_regex(field(col="group_id"), self.query_param["group_id"]))),
+                            .where(in_with_regex(field(col="group_id"), self.query_param["group_id"])),
+                            output_column="pass"),  # Pass on the distinct 'pass' values only
                         
                         # Second query to get all records from the 'users' table using 'user_id' from the first query
                         ChainedQuery(Query